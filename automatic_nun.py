@@ -5,28 +5,274 @@ Directory structure -
     data/
     -- dataset_csv
     -- label_titles_csv
-    -- overlap_scores/
-        -- [overlap_11101700_12141700.csv, # overlap_classA_classB
-            ...
-            ]
-    -- label_frequency_csv
-    -- unspsc_title_similarity_csv
+    -- overlap_scores/ # one Parquet dataset, partitioned by label_1
+        -- 11101700/ # classA
+            -- [part-<batch>-0.parquet, # LID pairs of (classA, classB) for every classB scored in that batch
+                ...
+                ]
+    -- label_frequency_parquet
+    -- unspsc_title_similarity_parquet
+
+Note: intermediate and final dataframes are persisted as Parquet (snappy) files next to their configured path, with the extension swapped;
+CSV files generated by earlier versions are still picked up when no Parquet file exists.
+Per class pair overlap_classA_classB files generated by earlier versions are ignored; those pairs are scored again.
 """
 
 import logging
 import os
-import re
+import uuid
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 import spacy
 
-from pandarallel import pandarallel
-from spacy_langdetect import LanguageDetector
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
 
 from tqdm import tqdm
 
 
 
+OVERLAP_SCORES_PARTITIONING = ds.partitioning(pa.schema([('label_1', pa.int64())]))
+
+
+
+def _parquet_path(path: str) -> str:
+
+    '''
+    Returns the Parquet counterpart of a configured (CSV) path by swapping its extension.
+    '''
+
+    return os.path.splitext(path)[0] + '.parquet'
+
+
+
+def _exists(path: str) -> bool:
+
+    '''
+    Checks whether a dataframe has already been persisted to path, either as Parquet or as a legacy CSV.
+    '''
+
+    return os.path.isfile(_parquet_path(path)) or os.path.isfile(path)
+
+
+
+def _read(path: str) -> pd.DataFrame:
+
+    '''
+    Reads a persisted dataframe, preferring its Parquet file and falling back to a legacy CSV.
+    '''
+
+    '''
+    Calls: _parquet_path().
+    Callee(s): OverlapAnalysis.generate_label_frequency(), OverlapAnalysis.generate_interest_pairs().
+    '''
+
+    parquet_path = _parquet_path(path)
+
+    if os.path.isfile(parquet_path):
+        return pd.read_parquet(parquet_path, engine = 'pyarrow', pre_buffer = True)
+
+    return pd.read_csv(path, index_col = 0)
+
+
+
+def _write(df: pd.DataFrame, path: str) -> str:
+
+    '''
+    Writes a dataframe as a snappy compressed Parquet file and returns the path it was written to.
+    '''
+
+    '''
+    Calls: _parquet_path().
+    Callee(s): OverlapAnalysis.generate_label_frequency(), OverlapAnalysis.generate_interest_pairs(), OverlapAnalysis.overlap_analysis().
+    '''
+
+    parquet_path = _parquet_path(path)
+
+    df.to_parquet(parquet_path, engine = 'pyarrow', compression = 'snappy', index = False)
+
+    return parquet_path
+
+
+
+def _read_overlap_scores(overlap_scores_dir: str) -> pd.DataFrame:
+
+    '''
+    Reads the overlap scores dataset and returns the score of every pair of classes already in it,
+    averaged over all (duplicate included) pairs of their LIDs.
+    '''
+
+    '''
+    Calls: None.
+    Callee(s): OverlapAnalysis.overlap_analysis().
+    '''
+
+    overlap_scores = ds.dataset(overlap_scores_dir, format = 'parquet', partitioning = OVERLAP_SCORES_PARTITIONING, ignore_prefixes = ['.', '_', 'overlap_'])
+
+    if not overlap_scores.files:
+        return pd.DataFrame({
+            'label_1': pd.Series(dtype = 'int64'),
+            'label_2': pd.Series(dtype = 'int64'),
+            'similarity': pd.Series(dtype = 'float64')
+        })
+
+    scores_df = overlap_scores.to_table(
+        columns = ['label_1', 'label_2', 'unigram_overlap_score', 'count'],
+        fragment_scan_options = ds.ParquetFragmentScanOptions(pre_buffer = True)
+    ).to_pandas()
+
+    scores_df['unigram_overlap_score'] = scores_df['unigram_overlap_score'] * scores_df['count']
+    scores_df = scores_df.groupby(['label_1', 'label_2'], as_index = False)[['unigram_overlap_score', 'count']].sum()
+    scores_df['similarity'] = scores_df['unigram_overlap_score'] / scores_df['count']
+
+    return scores_df[['label_1', 'label_2', 'similarity']]
+
+
+
+def _write_overlap_scores(crossed_lid_dfs: list, overlap_scores_dir: str) -> None:
+
+    '''
+    Appends the scored LID pairs of a batch of class pairs to the overlap scores dataset, as snappy compressed Parquet files partitioned by label_1.
+    '''
+
+    '''
+    Calls: None.
+    Callee(s): OverlapAnalysis.overlap_analysis().
+    '''
+
+    ds.write_dataset(
+        pa.Table.from_pandas(pd.concat(crossed_lid_dfs, ignore_index = True), preserve_index = False),
+        overlap_scores_dir,
+        format = 'parquet',
+        partitioning = OVERLAP_SCORES_PARTITIONING,
+        # unique per batch, so that earlier batches in the same partition are never overwritten.
+        basename_template = 'part-' + uuid.uuid4().hex + '-{i}.parquet',
+        existing_data_behavior = 'overwrite_or_ignore',
+        file_options = ds.ParquetFileFormat().make_write_options(compression = 'snappy')
+    )
+
+
+
+def _upper_triangle_pairs(labels: np.ndarray) -> (np.ndarray, np.ndarray):
+
+    '''
+    Takes in an array of distinct labels and returns index arrays (i, j) enumerating every unordered pair of them exactly once,
+    oriented so that labels[i] < labels[j]; (a, a) and (b, a) pairs are never generated in the first place.
+    '''
+
+    '''
+    Calls: None.
+    Callee(s): OverlapAnalysis.generate_interest_pairs().
+    '''
+
+    # in sorted order, the upper triangle of the (label x label) grid holds exactly the pairs with label_1 < label_2.
+    order = np.argsort(labels, kind = 'stable')
+    i, j = np.triu_indices(len(labels), k = 1)
+
+    return order[i], order[j]
+
+
+
+def unigrams_in_common(
+    lid_1: str,
+    lid_2: str
+) -> str:
+
+    '''
+    Custom function that returns the comma separated unigrams two preprocessed LIDs have in common.
+    '''
+
+    common_unigrams = list(set(lid_1.split(' ')).intersection(lid_2.split(' ')))
+
+    return ','.join(common_unigrams)
+
+
+
+def unigram_overlap_scores(unigrams_1, unigrams_2) -> np.ndarray:
+
+    '''
+    Takes in two binary (LID x unigram) sparse matrices and returns the matrix of similarity scores between every pair of their rows,
+    i.e. the number of unigrams in common over the average number of unigrams of both LIDs.
+    '''
+
+    '''
+    Calls: None.
+    Callee(s): compute_class_overlaps().
+    '''
+
+    common = (unigrams_1 @ unigrams_2.T).toarray()
+
+    sizes_1 = np.asarray(unigrams_1.sum(axis = 1)).ravel()
+    sizes_2 = np.asarray(unigrams_2.sum(axis = 1)).ravel()
+    sizes = sizes_1[:, None] + sizes_2[None, :]
+
+    return np.divide(2 * common, sizes, out = np.zeros(common.shape), where = sizes > 0)
+
+
+
+def compute_class_overlaps(
+    label_1: int,
+    label_2: int,
+    lids_1: np.ndarray,
+    lids_2: np.ndarray,
+    counts_1: np.ndarray,
+    counts_2: np.ndarray,
+    unigrams_1,
+    unigrams_2
+) -> [float, pd.DataFrame]:
+
+    '''
+    Computes the unigram overlap score for a `pair` of classes, given their distinct reduced LIDs, how often each of them occurs within its class
+    and the matching rows of the binary (LID x unigram) matrix, and returns the score averaged over all (duplicate included) pairs of LIDs.
+    Also returns these results for each pair of LID (i, j) where i is from Class A and j is from Class B, to be exported to the overlap scores dataset.
+    Defined at module level (rather than within overlap_analysis()) so that it can be pickled and dispatched to worker processes.
+    '''
+
+    '''
+    Calls: unigram_overlap_scores(), unigrams_in_common().
+    Callee(s): OverlapAnalysis.overlap_analysis().
+    '''
+
+    """ print('comparing: ' + str(label_1) + ':' + str(label_2)) """
+
+    # score all possible pairs of distinct LIDs at once with a sparse matrix product, then flatten into a cross product.
+    # each pair stands for count_1 * count_2 duplicate pairs of the full cross product.
+    scores = unigram_overlap_scores(unigrams_1, unigrams_2) * 100
+    counts = np.outer(counts_1, counts_2)
+
+    crossed_lid_dfs = pd.DataFrame({
+        'label_1': np.full(len(lids_1) * len(lids_2), label_1, dtype = np.int64),
+        'label_2': np.full(len(lids_1) * len(lids_2), label_2, dtype = np.int64),
+        'lid_1_reduced': np.repeat(lids_1, len(lids_2)),
+        'lid_2_reduced': np.tile(lids_2, len(lids_1)),
+        'unigram_overlap_score': scores.ravel()
+    })
+
+    # drop (b, a) values when (a, b) already exist
+    # crossed_lid_dfs = crossed_lid_dfs.sort_values('lid_1_reduced')
+    # crossed_lid_dfs = crossed_lid_dfs[crossed_lid_dfs['lid_1_reduced'] < crossed_lid_dfs['lid_2_reduced']]
+
+    # get commons comma separated unigrams, in a separate pass since they are only exported; pairs that score 0 have none in common.
+    overlapping = np.flatnonzero(scores.ravel())
+    common_unigrams = np.full(len(crossed_lid_dfs), '', dtype = object)
+    common_unigrams[overlapping] = [
+        unigrams_in_common(lid_1, lid_2)
+        for lid_1, lid_2 in zip(crossed_lid_dfs.lid_1_reduced.to_numpy()[overlapping], crossed_lid_dfs.lid_2_reduced.to_numpy()[overlapping])
+    ]
+    crossed_lid_dfs['common_unigrams'] = common_unigrams
+    
+    # keep count of duplicate rows; duplicates themselves are never generated.
+    crossed_lid_dfs['count'] = counts.ravel()
+
+    return np.average(scores, weights = counts), crossed_lid_dfs.sort_values('unigram_overlap_score', ascending = False)
+
+
+
 class OverlapAnalysis:
 
     '''
@@ -59,6 +305,14 @@ class OverlapAnalysis:
         'v23_3': pd.DataFrame()
     }
 
+    _code_to_title = {}
+
+    _label_groups = {}
+
+    # label and label_title columns of label_frequency_df, as plain arrays for the pair computations.
+    _labels = np.array([], dtype = np.int64)
+    _label_titles = np.array([], dtype = object)
+
     label_frequency_df = pd.DataFrame(
         columns = [
             'label',
@@ -107,7 +361,7 @@ class OverlapAnalysis:
 
         '''
         Constructor that takes in root path of data directory within which the input dataset exists.
-        Necessary folders will be generated within this directory itself and populated with intermediate and final CSVs.
+        Necessary folders will be generated within this directory itself and populated with intermediate and final Parquet files.
 
         dataset_csv_name: filename of the input CSV file relative to the data directory.
         '''
@@ -121,19 +375,17 @@ class OverlapAnalysis:
 
         self.dataset_df = pd.read_csv(self.DATASET_PATH)
 
-        for sheet in title_sheets:
-            self.title_dfs[sheet] = pd.read_excel(self.LABEL_TITLES_PATH, engine = 'openpyxl', sheet_name = sheet)
+        # the workbook is opened and parsed once for all of its sheets.
+        with pd.ExcelFile(self.LABEL_TITLES_PATH, engine = 'openpyxl') as label_titles_file:
+            self.title_dfs.update(pd.read_excel(label_titles_file, sheet_name = title_sheets))
 
-        tqdm.pandas()
+        # UNSPSC code to title lookup; titles from later sheets take precedence.
+        self._code_to_title = {}
+        for sheet in self.title_dfs:
+            self._code_to_title.update(zip(self.title_dfs[sheet].Code.values, self.title_dfs[sheet].Title.values))
 
-        pandarallel.initialize()
-
-        self.spacy_nlp = spacy.load('en_core_web_sm')
-        self.spacy_nlp.add_pipe(
-            LanguageDetector(),
-            name = 'language_detector',
-            last = True
-        )
+        # only document vectors are used (for similarity scores), so everything but the tokenizer and tok2vec is disabled.
+        self.spacy_nlp = spacy.load('en_core_web_sm', disable = ['tagger', 'parser', 'ner', 'attribute_ruler', 'lemmatizer'])
 
         """ self.LOGGING_FORMATTER = '%(asctime)s.%(msecs)03d - %(threadName)s - %(levelname)s - %(message)s'
         self.DATE_FORMATTER = '%Y-%m-%d %H:%M:%S'
@@ -152,23 +404,16 @@ class OverlapAnalysis:
     def get_unspsc_label_title(self, unspsc_code: int) -> str: # train_data_initial_invoice
 
         '''
-        Takes in 8-digit UNSPSC code (str or numeric type), refers to external CSV and returns label title if found.
+        Takes in 8-digit UNSPSC code (numeric type), refers to the titles loaded from the external sheets and returns label title if found.
         Returns 'Unknown' if invalid UNSPSC code is passed in or external CSV does not have a match for a semantically valid code.
         '''
 
         '''
         Calls: None.
-        Callee(s): generate_label_frequency().
+        Callee(s): None.
         '''
 
-        title = 'Unknown'
-
-        for source_df in self.title_dfs:
-            source_df = self.title_dfs[source_df]
-            if len(source_df[source_df.Code == unspsc_code].Title):
-                title = source_df[source_df.Code == unspsc_code].Title.values[0]
-                
-        return title
+        return self._code_to_title.get(unspsc_code, 'Unknown')
 
 
 
@@ -176,63 +421,47 @@ class OverlapAnalysis:
 
         '''
         Iterates through unique UNSPSC codes from self.dataset_df, ordered by frequency, populates labels with their label title into a self.label_frequency_df.
-        Also generates a CSV file.
-        Possible improvement: maintain a permanent CSV file which records ell UNSPSC labels (and their titles ever encountered) - possibly better done with a database.
+        Also generates a Parquet file, and keeps the labels and their titles as arrays in self._labels and self._label_titles.
+        Possible improvement: maintain a permanent file which records ell UNSPSC labels (and their titles ever encountered) - possibly better done with a database.
         '''
 
         '''
-        Calls: get_unspsc_label_title().
+        Calls: _exists(), _read(), _write().
         Callee(s): constructor.
         '''
 
-        if os.path.isfile(self.LABEL_FREQUENCY_PATH):
+        if _exists(self.LABEL_FREQUENCY_PATH):
             print("label frequency file found.")
-            return pd.read_csv(self.LABEL_FREQUENCY_PATH)
+            label_frequency_df = _read(self.LABEL_FREQUENCY_PATH)
+            self._labels, self._label_titles = label_frequency_df.label.to_numpy(), label_frequency_df.label_title.to_numpy()
+            return label_frequency_df
 
         print("label frequency file not found. generating.")
 
-        df_v23_levels = self.dataset_df.v23_level3.value_counts()
+        df_v23_levels = self.dataset_df.v23_level3.value_counts().rename_axis('label').reset_index(name = 'count')
+        df_v23_levels['label_title'] = df_v23_levels['label'].map(self._code_to_title).fillna('Unknown')
 
-        rows = []
+        # determining level from the (overlapping) occurrences of '00' among the 8 digits of each code.
+        # (1 * (first % 2 == 1)) is added to handle the corner cases like 94132001.
+        codes = df_v23_levels['label'].to_numpy(dtype = np.int64)
+        zero_digits = (codes[:, None] // 10 ** np.arange(7, -1, -1) % 10) == 0
+        zero_pairs = zero_digits[:, :-1] & zero_digits[:, 1:]
+        n_zero_pairs = zero_pairs.sum(axis = 1)
+        first = zero_pairs.argmax(axis = 1)
 
-        for code in df_v23_levels.keys():
-            unspsc_title = self.get_unspsc_label_title(code)
-            
-            # determining level. (1 * (level[0] % 2 == 1) is added to handle the corner cases like 94132001.
-            level = [m.start() for m in re.finditer(r'(?=(00))', str(code))]
-            level = 4 - len(level) + (level[0] % 2 == 1 if len(level) == 1 else len(level) // 2)
-            
-            rows.append([code, level, df_v23_levels[code], unspsc_title])
-            
-        self.label_frequency_df = pd.DataFrame(data = rows,
-                                    columns=['label', 'level', 'count', 'label_title'])
+        df_v23_levels['level'] = 4 - n_zero_pairs + np.where(n_zero_pairs == 1, first % 2 == 1, n_zero_pairs // 2)
 
-        self.label_frequency_df = self.label_frequency_df[self.label_frequency_df.label_title != 'Unknown']
-
-        self.label_frequency_df.to_csv(self.LABEL_FREQUENCY_PATH)
-
-        print("label frequency file generated and saved as CSVfile to: " + self.LABEL_FREQUENCY_PATH)
-
-        return self.label_frequency_df
+        self.label_frequency_df = df_v23_levels[['label', 'level', 'count', 'label_title']]
 
+        self.label_frequency_df = self.label_frequency_df[self.label_frequency_df.label_title != 'Unknown']
 
+        self._labels, self._label_titles = self.label_frequency_df.label.to_numpy(), self.label_frequency_df.label_title.to_numpy()
 
-    def unigrams_in_common(
-        self,
-        lid_1: str,
-        lid_2: str
-    ) -> [float, list]:
-
-        '''
-        Custom method that returns a similarity score between two preprocessed LIDs.
-        '''
-
-        unigrams_1 = list(set(lid_1.split(' ')))
-        unigrams_2 = list(set(lid_2.split(' ')))
+        label_frequency_path = _write(self.label_frequency_df, self.LABEL_FREQUENCY_PATH)
 
-        common_unigrams = list(set(unigrams_1).intersection(unigrams_2))
+        print("label frequency file generated and saved as Parquet file to: " + label_frequency_path)
 
-        return len(common_unigrams) / ((len(unigrams_1) + len(unigrams_2)) / 2), ','.join(common_unigrams)
+        return self.label_frequency_df
 
 
 
@@ -260,190 +489,183 @@ class OverlapAnalysis:
     def generate_interest_pairs(self, similarity_metric: str = 'spacy') -> pd.DataFrame:
 
         '''
-        Uses self.label_frequency_df to list all possible pairs of classes and computes similarity between them to populate self.unspsc_title_similarity_df.
+        Uses the labels and titles of self.label_frequency_df (self._labels, self._label_titles) to list all possible pairs of classes and computes similarity between them to populate self.unspsc_title_similarity_df.
         '''
 
         '''
-        Calls: compute_similarity().
+        Calls: _upper_triangle_pairs().
         Callee(s): constructor.
         '''
 
 
-        def get_spacy_similarity(lid_1: str, lid_2: str) -> float:
+        def get_spacy_vectors(texts: list) -> np.ndarray:
 
             '''
-            Uses spacy's builtin similarity scores.
+            Parses texts in batches and returns their unit length spacy document vectors,
+            so that dot products between them are spacy's builtin (cosine) similarity scores.
             '''
 
-            return self.spacy_nlp(lid_1).similarity(self.spacy_nlp(lid_2))
-        
+            docs = self.spacy_nlp.pipe(texts, batch_size = 256)
+
+            return np.stack([doc.vector / (np.linalg.norm(doc.vector) or 1) for doc in docs])
+
 
 
-        if os.path.isfile(self.UNSPSC_TITLE_SIMILARITY_PATH):
+        if _exists(self.UNSPSC_TITLE_SIMILARITY_PATH):
             print("label similarity file found.")
-            return pd.read_csv(self.UNSPSC_TITLE_SIMILARITY_PATH)
+            return _read(self.UNSPSC_TITLE_SIMILARITY_PATH)
 
         print("label similarity file not found. generating.")
 
-        index = pd.MultiIndex.from_product([self.label_frequency_df.label, self.label_frequency_df.label], names = ["label_1", "label_2"])
-        crossed_labels = pd.DataFrame(index = index).reset_index()
+        labels = self._labels
+        titles = self._label_titles
 
-        index = pd.MultiIndex.from_product([self.label_frequency_df.label_title, self.label_frequency_df.label_title], names = ["label_title_1", "label_title_2"])
-        crossed_titles = pd.DataFrame(index = index).reset_index()
+        i, j = _upper_triangle_pairs(labels)
 
-        unspsc_title_similarity_df = pd.concat([crossed_labels, crossed_titles], axis = 1)
-        unspsc_title_similarity_df = unspsc_title_similarity_df[unspsc_title_similarity_df.label_1 != unspsc_title_similarity_df.label_2]
-        
-        # drop (b, a) values when (a, b) already exist
-        # unspsc_title_similarity_df = unspsc_title_similarity_df.sort_values('label_1')
-        unspsc_title_similarity_df = unspsc_title_similarity_df[unspsc_title_similarity_df['label_1'] < unspsc_title_similarity_df['label_2']]
+        unspsc_title_similarity_df = pd.DataFrame({
+            'label_1': labels[i],
+            'label_2': labels[j],
+            'label_title_1': titles[i],
+            'label_title_2': titles[j]
+        })
 
-        unspsc_title_similarity_df['titles_similarity_score'] = unspsc_title_similarity_df[['label_title_1', 'label_title_2']].parallel_apply(lambda x: get_spacy_similarity(*x), axis = 1)
+        # each title is parsed once, and all pairs are scored with a single matrix product.
+        title_vectors = get_spacy_vectors(titles.tolist())
+        unspsc_title_similarity_df['titles_similarity_score'] = (title_vectors @ title_vectors.T)[i, j]
 
         self.unspsc_title_similarity_df = unspsc_title_similarity_df
 
-        self.unspsc_title_similarity_df.to_csv(self.UNSPSC_TITLE_SIMILARITY_PATH)
+        unspsc_title_similarity_path = _write(self.unspsc_title_similarity_df, self.UNSPSC_TITLE_SIMILARITY_PATH)
 
-        print("label similarity file generated and saved as CSVfile to: " + self.UNSPSC_TITLE_SIMILARITY_PATH)
+        print("label similarity file generated and saved as Parquet file to: " + unspsc_title_similarity_path)
 
         return self.unspsc_title_similarity_df
 
 
 
-    def remove_special_chars(self, lid_string: str, specials: str = ',.-') -> str:
+    def preprocess_lids(self) -> None: # oa_2; sampling_6.4m
 
         '''
-        Replaces parameterized (a specified list of) special characters in a string with a single whitespace.
+        Add two columns to self.dataset_df; one that uses simple concatenation of all line item descriptions
+        and another that uses special sanitization to reduce string to only common unigrams.
         '''
 
         '''
         Calls: None.
-        Callee(s): reduce_by_unigrams().
+        Callee(s): constructor.
         '''
 
-        for special in specials:
-            lid_string = lid_string.replace(special, ' ')
-
-        return lid_string
-
-
-
-    def reduce_by_unigrams(
-        self,
-        lid_string: str # list of LID strings: PartDescription1, PartDescription, InvoiceDescription, PODescription
-    ) -> str: # print_uni, unigramsInCommon, oa_2; sampling_6.4m
-
-        '''
-        Splits a string by a list of provided special characters, then reduces strings to unique unigrams.
-        '''
+        print("preprocessing LIDs into concatenated and reduced.")
 
-        '''
-        Calls: remove_special_chars().
-        Callee(s): preprocess_lids().
-        '''
+        # concatenate all line item descriptions in a single pass over arrow string arrays, with missing descriptions as empty strings.
+        lid_columns = [
+            pa.array(self.dataset_df[column], type = pa.string(), from_pandas = True)
+            for column in ['PartDescription1', 'PartDescription2', 'InvoiceDescription', 'PODescription']
+        ]
+        lid_concatenated = pc.binary_join_element_wise(*lid_columns, '', null_handling = 'replace', null_replacement = '')
+        self.dataset_df['lid_concatenated'] = pd.Series(pd.arrays.ArrowExtensionArray(lid_concatenated), index = self.dataset_df.index)
 
-        if isinstance(lid_string, float):
-            return ''
-        
-        unigrams = []
+        # replace special characters with whitespace, split into unigrams and keep only the first occurrence of each, in order.
+        lid_unigrams = self.dataset_df['lid_concatenated'].str.replace(r'[,.\-]+', ' ', regex = True).str.strip().str.split()
+        self.dataset_df['lid_reduced'] = lid_unigrams.map(lambda unigrams: ' '.join(dict.fromkeys(unigrams)))
 
-        lid_string = self.remove_special_chars(lid_string)
-        for word in lid_string.split():
-            if word not in unigrams:
-                unigrams.append(word)
+        # labels and reduced LIDs are grouped and compared many times over; categories reduce that to their integer codes.
+        self.dataset_df['v23_level3'] = self.dataset_df['v23_level3'].astype('category')
+        self.dataset_df['lid_reduced'] = self.dataset_df['lid_reduced'].astype('category')
 
-        return ' '.join(unigrams)
+        print("done preprocessing LIDs.")
 
 
 
-    def preprocess_lids(self) -> None: # oa_2; sampling_6.4m
+    def overlap_analysis(self, offset: int = 0, batch_size: int = 256, n_jobs: int = -1) -> int: # oa_2
 
         '''
-        Add two columns to self.dataset_df; one that uses simple concatenation of all line item descriptions
-        and another that uses special sanitization to reduce string to only common unigrams.
+        Iterates through pairs of classes from self.unspsc_title_similarity_df,
+        and returns a global averaged overlap score, which is appended in different columns on self.unspsc_title_similarity_df.
+        Scored pairs of LIDs are appended to the overlap scores dataset every batch_size pairs of classes.
+        Pairs of classes are scored by n_jobs worker processes (joblib semantics; -1 uses all CPUs), started only if any pair is left to score.
         '''
 
-        '''
-        Calls: reduce_by_unigrams().
-        Callee(s): constructor.
-        '''
+        def class_overlap_tasks(pairs: np.ndarray):
 
-        print("preprocessing LIDs into concatenated and reduced.")
+            '''
+            Yields a compute_class_overlaps() call for every pair of classes at the given positions of labels_1 and labels_2,
+            along with the distinct LIDs, their counts and unigram rows of both classes.
+            '''
 
-        self.dataset_df['PartDescription1'] = self.dataset_df['PartDescription1'].fillna('')
-        self.dataset_df['PartDescription2'] = self.dataset_df['PartDescription2'].fillna('')
-        self.dataset_df['InvoiceDescription'] = self.dataset_df['InvoiceDescription'].fillna('')
-        self.dataset_df['PODescription'] = self.dataset_df['PODescription'].fillna('')
-        self.dataset_df['lid_concatenated'] = self.dataset_df['PartDescription1'] + self.dataset_df['PartDescription2'] + self.dataset_df['InvoiceDescription'] + self.dataset_df['PODescription']
-        self.dataset_df['lid_reduced'] = self.dataset_df['lid_concatenated'].apply(self.reduce_by_unigrams)
+            for label_1, label_2 in zip(labels_1[pairs], labels_2[pairs]):
 
-        print("done preprocessing LIDs.")
+                rows_1, counts_1 = self._label_groups[label_1]
+                rows_2, counts_2 = self._label_groups[label_2]
 
+                yield delayed(compute_class_overlaps)(label_1, label_2, lids[rows_1], lids[rows_2], counts_1, counts_2, lid_unigrams[rows_1], lid_unigrams[rows_2])
 
+        print('beginning overlap analysis.')
 
-    def overlap_analysis(self, offset: int = 0) -> int: # oa_2
+        if not os.path.exists(self.OVERLAP_SCORES_DIR):
+            os.makedirs(self.OVERLAP_SCORES_DIR)
 
-        '''
-        Iterates through pairs of classes from self.unspsc_title_similarity_df,
-        and returns a global averaged overlap score, which is appended in different columns on self.unspsc_title_similarity_df.
-        '''
+        # distinct reduced LIDs, and the binary (LID x unigram) matrix over the global unigram vocabulary; both are indexed by the category codes of self.dataset_df.lid_reduced.
+        lids = self.dataset_df.lid_reduced.cat.categories.to_numpy()
+        lid_codes = self.dataset_df.lid_reduced.cat.codes.to_numpy()
+        lid_unigrams = CountVectorizer(binary = True, lowercase = False, token_pattern = r'\S+').fit_transform(lids).tocsr()
 
-        def compute_class_overlaps(label_1: int, label_2: int) -> None:
+        # distinct LIDs of each class along with their counts, grouped once instead of masking the whole dataset twice per pair,
+        # so that duplicate LIDs are scored once.
+        self._label_groups = {}
 
-            '''
-            Computes each type of similarity score for a `pair` of classes as specified in self.similarity_metrics, and returns a dictionary of said score.
-            Also, exports these results to a CSV file for each pair of LID (i, j) where i is from Class A and j is from Class B.
-            '''
+        for label, rows in self.dataset_df.groupby('v23_level3', sort = False, observed = True).indices.items():
+            self._label_groups[label] = np.unique(lid_codes[rows], return_counts = True)
+
+        # classes that do not share a single unigram score 0 on every pair of their LIDs; find them up front from a (class x unigram) matrix,
+        # so that their cross products are never built.
+        label_positions = {label: position for position, label in enumerate(self._label_groups)}
+        class_codes = [codes for codes, _ in self._label_groups.values()]
+
+        class_lids = sparse.csr_matrix(
+            (np.ones(sum(map(len, class_codes))), (np.repeat(np.arange(len(class_codes)), list(map(len, class_codes))), np.concatenate(class_codes))),
+            shape = (len(class_codes), len(lids))
+        )
+        class_unigrams = ((class_lids @ lid_unigrams) > 0).astype(np.int32)
+        classes_overlap = (class_unigrams @ class_unigrams.T).toarray() > 0
 
-            csv_name = 'overlap_' + str(label_1) + '_' + str(label_2) + '.csv'
+        # pairs of classes already in the overlap scores dataset are not scored again.
+        pairs_df = self.unspsc_title_similarity_df[['label_1', 'label_2']].merge(_read_overlap_scores(self.OVERLAP_SCORES_DIR), how = 'left', on = ['label_1', 'label_2'])
 
-            if not os.path.exists(self.OVERLAP_SCORES_DIR):
-                os.makedirs(self.OVERLAP_SCORES_DIR)
+        labels_1 = pairs_df.label_1.to_numpy()
+        labels_2 = pairs_df.label_2.to_numpy()
 
-            if os.path.isfile(os.path.join(self.OVERLAP_SCORES_DIR, csv_name)):
-                
-                """ print(csv_name + ' already found.') """
-                crossed_lid_dfs = pd.read_csv(os.path.join(self.OVERLAP_SCORES_DIR, csv_name))
-                return sum(crossed_lid_dfs.unigram_overlap_score) / len(crossed_lid_dfs.unigram_overlap_score)
-            
-            """ print('comparing: ' + str(label_1) + ':' + str(label_2)) """
+        overlapping = classes_overlap[
+            np.fromiter(map(label_positions.__getitem__, labels_1), dtype = np.intp, count = len(labels_1)),
+            np.fromiter(map(label_positions.__getitem__, labels_2), dtype = np.intp, count = len(labels_2))
+        ]
 
-            df1 = self.dataset_df[self.dataset_df.v23_level3 == label_1]
-            df2 = self.dataset_df[self.dataset_df.v23_level3 == label_2]
+        similarity = pairs_df.similarity.to_numpy(dtype = np.float64, copy = True)
+        similarity[~overlapping] = 0
+        pending = np.flatnonzero(np.isnan(similarity))
 
-            # perform cross product on LIDs to generate all possible pairs.
-            index = pd.MultiIndex.from_product([df1.lid_reduced, df2.lid_reduced], names = ["lid_1_reduced", "lid_2_reduced"])
-            crossed_lid_dfs = pd.DataFrame(index = index).reset_index()
-            
-            # drop (b, a) values when (a, b) already exist
-            # crossed_lid_dfs = crossed_lid_dfs.sort_values('lid_1_reduced')
-            # crossed_lid_dfs = crossed_lid_dfs[crossed_lid_dfs['lid_1_reduced'] < crossed_lid_dfs['lid_2_reduced']]
+        # remaining pairs of classes, if any, are spread across worker processes; the work within a pair is already vectorized.
+        if len(pending):
 
-            # get scores and commons comma separated unigrams
-            crossed_lid_dfs['unigram_overlap_score'], crossed_lid_dfs['common_unigrams'] = zip(*crossed_lid_dfs[['lid_1_reduced', 'lid_2_reduced']].parallel_apply(lambda x: self.unigrams_in_common(*x), axis = 1).to_numpy())
+            with Parallel(n_jobs = n_jobs, backend = 'loky', batch_size = 'auto') as parallel, tqdm(total = len(pending)) as progress_bar:
 
-            crossed_lid_dfs.unigram_overlap_score = crossed_lid_dfs.unigram_overlap_score * 100
-            
-            # keep count of duplicate rows and drop duplicates before exporting to CSV
-            crossed_lid_dfs['count'] = crossed_lid_dfs.groupby(['lid_1_reduced', 'lid_2_reduced']).transform('count')['unigram_overlap_score']
-            crossed_lid_dfs.drop_duplicates().sort_values('unigram_overlap_score', ascending = False).to_csv(os.path.join(self.OVERLAP_SCORES_DIR, csv_name))
+                for start in range(0, len(pending), batch_size):
 
-            return sum(crossed_lid_dfs.unigram_overlap_score) / len(crossed_lid_dfs.unigram_overlap_score)
+                    batch = pending[start:start + batch_size]
+                    results = parallel(class_overlap_tasks(batch))
 
-            '''
-            Calls: compute_similarity(), remove_special_chars().
-            Callee(s): run_overlap_analysis().
-            '''
+                    similarity[batch] = [score for score, _ in results]
+                    _write_overlap_scores([crossed_lid_dfs for _, crossed_lid_dfs in results], self.OVERLAP_SCORES_DIR)
 
-        print('beginning overlap analysis.')
+                    progress_bar.update(len(batch))
 
-        self.unspsc_title_similarity_df['similarity'] = self.unspsc_title_similarity_df[['label_1', 'label_2']].progress_apply(lambda x: compute_class_overlaps(*x), axis = 1)
-        self.unspsc_title_similarity_df.to_csv(self.OA_RESULT_PATH)
+        self.unspsc_title_similarity_df['similarity'] = similarity
+        oa_result_path = _write(self.unspsc_title_similarity_df, self.OA_RESULT_PATH)
 
-        print('overlap analysis concluded. result CSVfile saved to: ' + self.OA_RESULT_PATH)
+        print('overlap analysis concluded. result Parquet file saved to: ' + oa_result_path)
 
         '''
-        Calls: compute_class_overlaps().
+        Calls: _read_overlap_scores(), compute_class_overlaps(), _write_overlap_scores(), _write().
         Callee(s): constructor.
         '''
 